@@ -1,8 +1,16 @@
-import json
+import atexit
+import gc
+import multiprocessing
+import operator
 import os
+import pickle
+import select
+import socket
+import struct
 import sys
-import traceback
+import threading
 import unittest
+import weakref
 
 from contextlib import contextmanager
 from typing import Optional
@@ -11,10 +19,61 @@ import libafb
 
 _binder_config = {}
 _bindings = {}
+_fork_server = None
+_shared_binder = None
+
+# AFBTestCase instances by creation number. The fork server is a fork of
+# this process: it is sent the number of a test and runs that very
+# instance, with what was set on it before run().
+_test_instances = weakref.WeakValueDictionary()
+_n_test_instances = 0
+
+# Event handlers registered by assertEventEmitted, by event pattern. They
+# stay registered and call the callback set by the running assertion.
+_evt_handlers = {}
+
+# Run all the tests in a single event loop instead of forking a process
+# for each test. Tests then share the state of the binder and bindings.
+_SHARED_LOOP = os.environ.get("AFB_TEST_SHARED_LOOP") == "1"
+
+# test results are usually sent in one datagram, but a datagram cannot
+# be larger than the socket send buffer and tracebacks may be large
+_RESULT_CHUNK_SIZE = 1 << 16
+# a result of that size can be sent without waiting for the parent to read
+_RESULT_SNDBUF_SIZE = 1 << 20
+
+# TestResult attributes that are copied as is between processes
+_RESULT_ATTRS = (
+    "failfast",
+    "testsRun",
+    "shouldStop",
+    "buffer",
+    "tb_locals",
+    "_mirrorOutput",
+)
+_get_result_attrs = operator.itemgetter(*_RESULT_ATTRS)
+
+# TestResult attributes stored as bits of the binary result header, and
+# lists of tracebacks following the header
+_RESULT_FLAGS = (
+    "failfast",
+    "shouldStop",
+    "buffer",
+    "tb_locals",
+    "_mirrorOutput",
+    "skipped",
+    "unexpectedSuccesses",
+)
+_RESULT_TRACEBACKS = ("failures", "errors", "expectedFailures")
+
+# flags, testsRun and the number of tracebacks of each list
+_RESULT_HEADER = struct.Struct("<BIIII")
+# size of a traceback
+_RESULT_TB_SIZE = struct.Struct("<I")
 
 
 def serialize_test_case_result(result: unittest.TestResult):
-    """Serialize a TestResult into a JSON-dumpable dict."""
+    """Serialize a TestResult into a picklable dict."""
 
     # TestResult stores errors and failures as tuple of the form
     # (test_case, error_string) where test_case is the instance of the
@@ -35,18 +94,74 @@ def serialize_test_case_result(result: unittest.TestResult):
     }
 
 
+def serialize_result_binary(result: unittest.TestResult) -> bytes:
+    """Serialize a TestResult into bytes: a fixed size header followed by
+    length-prefixed UTF-8 tracebacks."""
+    flags = 0
+    for i, value in enumerate(
+        (
+            result.failfast,
+            result.shouldStop,
+            result.buffer,
+            result.tb_locals,
+            result._mirrorOutput,
+            result.skipped,
+            result.unexpectedSuccesses,
+        )
+    ):
+        if value:
+            flags |= 1 << i
+
+    tracebacks = (result.failures, result.errors, result.expectedFailures)
+    chunks = [
+        _RESULT_HEADER.pack(flags, result.testsRun, *(len(tbs) for tbs in tracebacks))
+    ]
+    pack_size = _RESULT_TB_SIZE.pack
+    for tbs in tracebacks:
+        for _, tb in tbs:
+            data = tb.encode("utf-8", "surrogatepass")
+            chunks.append(pack_size(len(data)))
+            chunks.append(data)
+
+    return b"".join(chunks)
+
+
+def unserialize_binary(buf) -> dict:
+    """Unserialize bytes written by serialize_result_binary into the dict
+    form expected by unserialize_in_result."""
+    view = memoryview(buf)
+
+    flags, tests_run, *counts = _RESULT_HEADER.unpack_from(view)
+    result_json = {
+        attr: bool(flags & (1 << i)) for i, attr in enumerate(_RESULT_FLAGS)
+    }
+    result_json["testsRun"] = tests_run
+
+    offset = _RESULT_HEADER.size
+    unpack_size = _RESULT_TB_SIZE.unpack_from
+    for key, count in zip(_RESULT_TRACEBACKS, counts):
+        tbs = []
+        for _ in range(count):
+            (size,) = unpack_size(view, offset)
+            offset += _RESULT_TB_SIZE.size
+            tbs.append(str(view[offset : offset + size], "utf-8", "surrogatepass"))
+            offset += size
+        result_json[key] = tbs
+
+    return result_json
+
+
 def unserialize_in_result(
     result: unittest.TestResult, result_json, test_case: unittest.TestCase
 ):
-    for attr in (
-        "failfast",
-        "testsRun",
-        "shouldStop",
-        "buffer",
-        "tb_locals",
-        "_mirrorOutput",
-    ):
-        setattr(result, attr, result_json[attr])
+    (
+        result.failfast,
+        result.testsRun,
+        result.shouldStop,
+        result.buffer,
+        result.tb_locals,
+        result._mirrorOutput,
+    ) = _get_result_attrs(result_json)
 
     result.failures += [(test_case, err) for err in result_json["failures"]]
     result.errors += [(test_case, err) for err in result_json["errors"]]
@@ -59,14 +174,120 @@ def unserialize_in_result(
     result.skipped += [test_case] if result_json["skipped"] else []
 
 
+def _guarded_notifier(fd, notify, fds_to_close):
+    """Wraps notify so that it does nothing once the file descriptors are
+    closed: event callbacks may run in binder threads, possibly after
+    assertEventEmitted returned and the descriptor numbers were reused"""
+    lock = threading.Lock()
+    closed = False
+
+    def on_evt(*args):
+        with lock:
+            if not closed:
+                notify()
+
+    def close():
+        nonlocal closed
+        with lock:
+            closed = True
+            for to_close in fds_to_close:
+                os.close(to_close)
+
+    return fd, on_evt, close
+
+
+if hasattr(os, "eventfd"):
+
+    def _evt_notifier():
+        """Returns a file descriptor that becomes readable once the returned
+        event callback is called, and a function to close it"""
+        efd = os.eventfd(0, os.EFD_CLOEXEC)
+
+        return _guarded_notifier(efd, lambda: os.eventfd_write(efd, 1), (efd,))
+
+else:
+    # os.eventfd is only available from Python 3.10
+
+    def _evt_notifier():
+        """Returns a file descriptor that becomes readable once the returned
+        event callback is called, and a function to close it"""
+        pipe_r, pipe_w = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+
+        def notify():
+            try:
+                os.write(pipe_w, b"x")
+            except BlockingIOError:
+                # the pipe is full, hence already readable
+                pass
+
+        return _guarded_notifier(pipe_r, notify, (pipe_r, pipe_w))
+
+
 class AFBTestCase(unittest.TestCase):
     """A base class for an AFB unit test. It makes sure the binder
     exists through self.binder and offers some helper methods"""
 
+    def __init__(self, *args, **kwargs):
+        global _n_test_instances
+
+        super().__init__(*args, **kwargs)
+        self._instance_key = _n_test_instances
+        _test_instances[self._instance_key] = self
+        _n_test_instances += 1
+
     def run(self, result=None):
         """Makes sure each test is launched in the main event loop"""
-        global _binder_config, _bindings
+        global _fork_server
+
+        if _shared_binder is not None:
+            # tests are already called from the event loop
+            self.binder = _shared_binder
+            return unittest.TestCase.run(self, result)
+
+        # afb-binder is not designed to have an event loop started,
+        # then stopped, then started for each test. A fork server holding
+        # a binder with all the bindings loaded is then started once,
+        # and it will fork() again for each test to start an event loop.
+        # The server is restarted for each test class, so that it sees
+        # what setUpClass() did in this process, and it is restarted for
+        # a test created after it was started.
+        if (
+            _fork_server is None
+            or _fork_server.test_class is not type(self)
+            or self._instance_key >= _fork_server.n_instances
+        ):
+            _stop_fork_server()
+            _fork_server = _ForkServer(type(self), result)
+
         self._result = None
+        state = {attr: getattr(result, attr) for attr in _RESULT_ATTRS}
+
+        parent_sock, child_sock = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET
+        )
+        try:
+            # the kernel caps it to net.core.wmem_max
+            child_sock.setsockopt(
+                socket.SOL_SOCKET, socket.SO_SNDBUF, _RESULT_SNDBUF_SIZE
+            )
+        except OSError:
+            pass
+
+        with parent_sock:
+            _fork_server.submit(self, state, child_sock.fileno())
+            child_sock.close()
+
+            chunks = []
+            while chunk := parent_sock.recv(_RESULT_CHUNK_SIZE):
+                chunks.append(chunk)
+            if not chunks:
+                raise RuntimeError(
+                    f"{self.id()}: the test process exited without a result"
+                )
+            unserialize_in_result(result, unserialize_binary(b"".join(chunks)), self)
+
+    def _run_forked(self, binder, result, result_sock):
+        """Runs the test in a process forked by the fork server"""
 
         def _cb(binder, _):
             # call the actual test method
@@ -76,121 +297,421 @@ class AFBTestCase(unittest.TestCase):
             # aborts the loop
             return 1
 
-        # afb-binder is not designed to have an event loop started,
-        # then stopped, then started for each test. We then fork() for
-        # each test and create a binder and an event loop each time
-
-        pipe_r, pipe_w = os.pipe()
-
-        pid = os.fork()
-        if pid == 0:
-            # child
-            os.close(pipe_r)
-            _binder = libafb.binder(
-                {
-                    "uid": "py-binder",
-                    "verbose": 255,
-                    "rootdir": ".",
-                    "set": _binder_config or {},
-                    # do not open a listening TCP socket for tests
-                    "port": 0,
-                }
-            )
+        self.binder = binder
 
-            for binding_uid, path in _bindings.items():
-                libafb.binding(
-                    {
-                        "uid": binding_uid,
-                        # Defining LD_LIBRARY_PATH might be needed to find .so files
-                        "path": path,
-                    }
-                )
+        r = libafb.loopstart(binder, _cb, None)
 
-            self.binder = _binder
+        # The process exits without the interpreter shutdown (atexit
+        # handlers, garbage collection, libafb destructors), output that
+        # may still be buffered has to be flushed here
+        for stream in (getattr(result, "stream", None), sys.stdout, sys.stderr):
+            if stream is not None:
+                stream.flush()
 
-            r = libafb.loopstart(_binder, _cb, None)
-
-            os.write(
-                pipe_w,
-                json.dumps(serialize_test_case_result(self._result)).encode("utf-8"),
-            )
-            os.close(pipe_w)
-            sys.exit(r)
-        else:
-            os.close(pipe_w)
-            pipe_r = os.fdopen(pipe_r)
-            unserialize_in_result(result, json.loads(pipe_r.read()), self)
-            pipe_r.close()
-            os.waitpid(pid, 0)
+        data = memoryview(serialize_result_binary(self._result))
+        for i in range(0, len(data), _RESULT_CHUNK_SIZE):
+            result_sock.send(data[i : i + _RESULT_CHUNK_SIZE])
+        result_sock.close()
+        os._exit(r if isinstance(r, int) else 0)
 
     @contextmanager
     def assertEventEmitted(self, api: str, event_name: str, timeout_ms: int = 100):
         """Helper context manager that allows to easily test that an event has been effectively called"""
-        import time
+        evt_fd, on_evt, close_notifier = _evt_notifier()
 
-        evt_received = False
+        pattern = f"{api}/{event_name}"
+        handler = _evt_handlers.get(pattern)
+        if handler is None:
+            handler = _evt_handlers[pattern] = {"cb": None}
 
-        def on_evt(*args):
-            nonlocal evt_received
-            evt_received = True
+            def _dispatch(*args, _handler=handler):
+                cb = _handler["cb"]
+                if cb is not None:
+                    cb(*args)
 
-        libafb.evthandler(
-            self.binder,
-            {"pattern": f"{api}/{event_name}", "callback": on_evt},
-        )
+            libafb.evthandler(
+                self.binder,
+                {"pattern": pattern, "callback": _dispatch},
+            )
 
-        yield
+        previous_cb = handler["cb"]
+        handler["cb"] = on_evt
 
-        elapsed = 0
-        while elapsed <= timeout_ms and not evt_received:
-            elapsed += 10
-            time.sleep(0.01)
+        try:
+            yield
 
-        libafb.evtdelete(self.binder, f"{api}/{event_name}")
+            # wake up as soon as the event is received, poll() rather than
+            # select() as descriptor numbers may be above FD_SETSIZE
+            poller = select.poll()
+            poller.register(evt_fd, select.POLLIN)
+            evt_received = bool(poller.poll(timeout_ms))
+        finally:
+            handler["cb"] = previous_cb
+            close_notifier()
 
         assert evt_received
 
 
+class _ForkServer:
+    """Process that creates the binder and loads bindings once, then
+    forks a new process for each test it is sent
+
+    Tests are sent by instance number on a UNIX socket, along with the
+    end of a socket pair on which the forked process sends the test result.
+    """
+
+    def __init__(self, test_class: type, result: unittest.TestResult):
+        self.test_class = test_class
+        # instances created from now on are unknown to the server
+        self.n_instances = _n_test_instances
+
+        self.sock, server_sock = socket.socketpair(
+            socket.AF_UNIX, socket.SOCK_SEQPACKET
+        )
+
+        # do not let every forked process write what is still buffered,
+        # including results reported from this process (e.g. setUpClass
+        # errors)
+        for stream in (getattr(result, "stream", None), sys.stdout, sys.stderr):
+            if stream is not None:
+                stream.flush()
+
+        self.pid = os.fork()
+        if self.pid == 0:
+            self.sock.close()
+            # neither the server nor the test processes it forks may
+            # return to the caller, whatever is raised
+            try:
+                self._serve(server_sock, result)
+            except BaseException:
+                import traceback
+
+                traceback.print_exc()
+                os._exit(1)
+            os._exit(0)
+
+        server_sock.close()
+
+    def _serve(self, sock: socket.socket, result: unittest.TestResult):
+        binder = _load_binder()
+
+        # Move every object allocated so far out of reach of the garbage
+        # collector, so that collections in forked processes do not
+        # touch (and thus copy) the pages inherited from this process
+        gc.freeze()
+
+        # Forked processes are not waited for one by one: a test process
+        # has sent its result before exiting, so the next test can start
+        # while it is exiting. Exited processes are reaped in batch.
+        pids = set()
+
+        while True:
+            msg, fds, _, _ = socket.recv_fds(sock, 1 << 16, 1)
+            if not msg:
+                # the other end has been closed
+                for pid in pids:
+                    os.waitpid(pid, 0)
+                return
+
+            while pids:
+                pid, _ = os.waitpid(-1, os.WNOHANG)
+                if pid == 0:
+                    break
+                pids.discard(pid)
+
+            # Received file descriptors are inheritable: a process spawned
+            # by a test or a binding would keep the result socket open, and
+            # the parent would wait for it to exit to see the socket closed
+            os.set_inheritable(fds[0], False)
+
+            instance_key, state = pickle.loads(msg)
+            test = _test_instances[instance_key]
+            pid = os.fork()
+            if pid == 0:
+                sock.close()
+
+                # only report what happens in this test
+                for attr, value in state.items():
+                    setattr(result, attr, value)
+                for outcomes in (
+                    result.failures,
+                    result.errors,
+                    result.skipped,
+                    result.expectedFailures,
+                    result.unexpectedSuccesses,
+                ):
+                    outcomes.clear()
+
+                test._run_forked(binder, result, socket.socket(fileno=fds[0]))
+
+            os.close(fds[0])
+            pids.add(pid)
+
+    def submit(self, test: unittest.TestCase, state: dict, result_fd: int):
+        """Asks the server to run a test, the result will be sent on result_fd"""
+        socket.send_fds(
+            self.sock, [pickle.dumps((test._instance_key, state))], [result_fd]
+        )
+
+    def stop(self):
+        self.sock.close()
+        os.waitpid(self.pid, 0)
+
+
+def _binder_params() -> dict:
+    return {
+        "uid": "py-binder",
+        "verbose": 255,
+        "rootdir": ".",
+        "set": _binder_config or {},
+        # do not open a listening TCP socket for tests
+        "port": 0,
+    }
+
+
+def _load_binder():
+    """Creates the binder and loads the configured bindings"""
+    binder = libafb.binder(_binder_params())
+
+    for binding_uid, path in _bindings.items():
+        libafb.binding(
+            {
+                "uid": binding_uid,
+                # Defining LD_LIBRARY_PATH might be needed to find .so files
+                "path": path,
+            }
+        )
+
+    return binder
+
+
+def _delete_evt_handlers(binder):
+    for pattern in _evt_handlers:
+        libafb.evtdelete(binder, pattern)
+    _evt_handlers.clear()
+
+
+def _run_in_shared_loop(func):
+    """Calls func from the event loop of a binder shared by all tests"""
+    global _shared_binder
+
+    _shared_binder = _load_binder()
+    error = None
+
+    def _cb(binder, _):
+        nonlocal error
+        try:
+            func()
+        except BaseException as e:
+            # do not let exceptions (including SystemExit) go through libafb
+            error = e
+
+        _delete_evt_handlers(binder)
+
+        # aborts the loop
+        return 1
+
+    libafb.loopstart(_shared_binder, _cb, None)
+    _shared_binder = None
+
+    if error is not None:
+        raise error
+
+
+class _SharedLoopSuite(unittest.TestSuite):
+    """Test suite run from the event loop of a binder shared by its tests"""
+
+    def run(self, result, debug=False):
+        run = super().run
+        _run_in_shared_loop(lambda: run(result, debug))
+        return result
+
+
+def _stop_fork_server():
+    global _fork_server
+
+    if _fork_server is not None:
+        _fork_server.stop()
+        _fork_server = None
+
+
+atexit.register(_stop_fork_server)
+
+
+def _iter_tests(suite: unittest.TestSuite):
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from _iter_tests(test)
+        else:
+            yield test
+
+
 class TAPTestResult(unittest.result.TestResult):
     """TestResult class that outputs test results in the TAP format"""
 
-    def __init__(self, n_tests: int, stream=None):
+    def __init__(self, n_tests: int, stream=None, test_n=None):
+        """test_n is a shared multiprocessing.Value holding the number of
+        the last reported test, to be given when several processes report tests to
+        the same output. The plan line is then left to the caller."""
         super().__init__()
         self.n_tests = n_tests
-        self.stream = stream or sys.stdout
 
-        self.stream.write(f"1..{self.n_tests}\n")
-        self.stream.flush()
+        stream = stream or sys.stdout
+        try:
+            # write to the same file through our own buffer, flushed at
+            # the end of the test run rather than after each line
+            fd = stream.fileno()
+        except (AttributeError, OSError):
+            self.stream = stream
+        else:
+            stream.flush()
+            self.stream = open(
+                fd,
+                "w",
+                buffering=1 << 16,
+                encoding=getattr(stream, "encoding", None),
+                closefd=False,
+            )
 
-        self.test_n = 0
+        # tests are reported by forked processes, the number of the last
+        # reported test is kept in shared memory
+        self._shared = test_n is not None
+        if test_n is None:
+            test_n = multiprocessing.Value("i", 0)
+            self.stream.write(f"1..{self.n_tests}\n")
+            self.stream.flush()
+        self._test_n = test_n
+
+        self._ok = "ok %d - %s\n".__mod__
+        self._not_ok = "not ok %d - %s # Exception:\n".__mod__
+        self._skip = "ok %d - %s # SKIP\n".__mod__
+
+    @property
+    def test_n(self) -> int:
+        return self._test_n.value
+
+    def _write_result(self, line, test, err=None):
+        with self._test_n.get_lock():
+            # TAP tests are numbered from 1
+            self._test_n.value += 1
+            self.stream.write(line((self._test_n.value, test.shortDescription())))
+            if err is not None:
+                import traceback
+
+                exc_type, exc, tb = err
+                traceback.print_exception(exc_type, exc, tb, file=self.stream)
+
+            if self._shared:
+                # keep lines in order with the other processes
+                self.stream.flush()
 
     def addSuccess(self, test):
-        self.stream.write(f"ok {self.test_n} - {test.shortDescription()}\n")
-        self.stream.flush()
-        self.test_n += 1
+        self._write_result(self._ok, test)
+
+    def addSkip(self, test, reason):
+        self._write_result(self._skip, test)
+        super().addSkip(test, reason)
 
     def addError(self, test, err):
-        exc_type, exc, tb = err
-        self.stream.write(
-            f"not ok {self.test_n} - {test.shortDescription()} # Exception:\n"
-        )
-        traceback.print_exception(exc_type, exc, tb, file=self.stream)
-        self.stream.flush()
-        self.test_n += 1
+        self._write_result(self._not_ok, test, err)
         super().addError(test, err)
 
     def addFailure(self, test, err):
         self.addError(test, err)
 
+    def stopTestRun(self):
+        self.stream.flush()
+
 
 class TAPTestRunner:
+    def __init__(self, jobs: int = 1):
+        self.jobs = jobs
+
     def run(self, test):
+        if self.jobs > 1:
+            return self._run_parallel(test)
+
         result = TAPTestResult(test.countTestCases())
 
-        test(result)
+        result.startTestRun()
+        try:
+            test(result)
+        finally:
+            result.stopTestRun()
 
         return result
 
+    def _run_parallel(self, test):
+        """Splits tests among worker processes writing to the same output"""
+        ctx = multiprocessing.get_context("fork")
+
+        n_tests = test.countTestCases()
+        result = TAPTestResult(n_tests)
+        test_n = ctx.Value("i", 0)
+
+        # Contiguous shards keep the tests of a class together, as a
+        # fork server is started for each test class in a worker
+        tests = list(_iter_tests(test))
+        shard_size = max(1, -(-len(tests) // self.jobs))
+
+        workers = []
+        for i in range(0, len(tests), shard_size):
+            reader, writer = ctx.Pipe(duplex=False)
+            worker = ctx.Process(
+                target=_run_tap_worker,
+                args=(
+                    unittest.TestSuite(tests[i : i + shard_size]),
+                    n_tests,
+                    test_n,
+                    writer,
+                ),
+            )
+            worker.start()
+            writer.close()
+            workers.append((worker, reader))
+
+        result.startTestRun()
+        for worker, reader in workers:
+            with reader:
+                try:
+                    worker_result = reader.recv()
+                except EOFError:
+                    worker_result = None
+            worker.join()
+
+            if worker_result is None:
+                result.errors.append(
+                    (test, f"Test worker exited with code {worker.exitcode}")
+                )
+                continue
+
+            # outcomes are only attached to the whole suite, they are
+            # gathered for the exit status
+            tests_run = result.testsRun
+            unserialize_in_result(result, worker_result, test)
+            result.testsRun += tests_run
+        result.stopTestRun()
+
+        return result
+
+
+def _run_tap_worker(suite: unittest.TestSuite, n_tests: int, test_n, writer):
+    result = TAPTestResult(n_tests, test_n=test_n)
+
+    if _SHARED_LOOP:
+        suite = _SharedLoopSuite([suite])
+
+    result.startTestRun()
+    try:
+        suite(result)
+    finally:
+        result.stopTestRun()
+        # atexit handlers do not run in multiprocessing workers
+        _stop_fork_server()
+
+    writer.send(serialize_test_case_result(result))
+    writer.close()
+
 
 class AFBTestProgram(unittest.TestProgram):
     """Main test program
@@ -207,22 +728,36 @@ class AFBTestProgram(unittest.TestProgram):
             dest="tap_format",
             help="Use TAP as output format",
         )
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=1,
+            dest="jobs",
+            help="Run tests in JOBS parallel processes (with --tap)",
+        )
         return parser
 
-    def runTests(self, skip=True) -> None:
-        if not skip:
-            return super().runTests()
+    def parseArgs(self, argv):
+        super().parseArgs(argv)
 
+        # the test runner depends on our own arguments
+        if self.tap_format:
+            self.testRunner = TAPTestRunner(jobs=self.jobs)
+        elif self.jobs > 1:
+            sys.exit("--jobs is only supported with --tap")
 
-def run_afb_binding_tests(bindings: dict, config: Optional[dict] = None):
-    """Main test function to be called in __main__"""
-    global _binder
+        if _SHARED_LOOP:
+            # with --jobs, tests are split among workers which each
+            # start their own loop
+            self.test = _SharedLoopSuite([self.test])
 
-    tp = AFBTestProgram(testRunner=TAPTestRunner() if "--tap" in sys.argv else None)
 
+def run_afb_binding_tests(bindings: dict, config: Optional[dict] = None):
+    """Main test function to be called in __main__"""
     configure_afb_binding_tests(bindings, config)
 
-    tp.runTests(skip=False)
+    AFBTestProgram()
 
 
 def configure_afb_binding_tests(bindings: dict, config: Optional[dict] = None):
@@ -231,5 +766,19 @@ def configure_afb_binding_tests(bindings: dict, config: Optional[dict] = None):
     global _binder_config
     global _bindings
 
+    # The shared binder is created before any test (or setUpModule()) is
+    # run, and it cannot be recreated once its event loop has started
+    if _shared_binder is not None and (bindings, config) != (
+        _bindings,
+        _binder_config,
+    ):
+        raise RuntimeError(
+            "With AFB_TEST_SHARED_LOOP=1, bindings and configuration must be "
+            "passed to run_afb_binding_tests() and cannot be changed by tests"
+        )
+
+    # a running fork server would still use the previous configuration
+    _stop_fork_server()
+
     _bindings = bindings
     _binder_config = config
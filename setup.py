@@ -1,4 +1,4 @@
-from setuptools import setup, find_packages
+from setuptools import setup
 
 setup(
     name="afb-test",
@@ -7,6 +7,8 @@ setup(
     author="IoT.BZH",
     author_email="contact@iot.bzh",
     description="AFB Python test framework",
-    packages=find_packages(),
+    packages=["afb_test"],
+    zip_safe=False,
+    python_requires=">=3.9",
     install_requires=[],
 )